@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for backend infrastructure.
+
+    python bench.py ratelimit [--iterations N] [--keys K]
+    python bench.py storage [--backend sqlite|mongo ...] [--posts N]
+
+The Mongo storage benchmark needs MONGO_URL and writes to a throwaway database.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from ratelimit import AdmissionControl, MemoryRateLimitStore, RateLimiter
+from storage import BACKENDS, create_storage
+
+
+async def bench_ratelimit(iterations: int, keys: int):
+    # Mirrors the auth path: IP bucket + account bucket + admission cap
+    store = MemoryRateLimitStore()
+    ip_limiter = RateLimiter.per_minute(store, 10**9, name="auth attempts")
+    account_limiter = RateLimiter.per_minute(store, 10**9, name="auth attempts")
+    admission = AdmissionControl(limit=8, name="auth requests")
+    ips = [f"auth:ip:10.0.{i // 256}.{i % 256}" for i in range(keys)]
+    accounts = [f"auth:account:user{i}@example.com" for i in range(keys)]
+
+    async def baseline():
+        start = time.perf_counter()
+        for i in range(iterations):
+            ips[i % keys], accounts[i % keys]
+        return time.perf_counter() - start
+
+    async def limited():
+        start = time.perf_counter()
+        for i in range(iterations):
+            await ip_limiter.hit(ips[i % keys])
+            await account_limiter.hit(accounts[i % keys])
+            async with admission:
+                pass
+        return time.perf_counter() - start
+
+    empty = await baseline()
+    elapsed = await limited()
+    per_request = (elapsed - empty) / iterations * 1e6
+    print(f"ratelimit: {iterations} requests over {keys} keys, "
+          f"{per_request:.2f} us/request overhead")
+
+
+async def timed(label: str, count: int, make_call):
+    start = time.perf_counter()
+    for i in range(count):
+        await make_call(i)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<16} {count / elapsed:>10.0f} ops/s  {elapsed / count * 1e3:>7.3f} ms/op")
+
+
+async def bench_storage(backend: str, posts: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        if backend == "sqlite":
+            storage = create_storage("sqlite", path=os.path.join(tmp, "bench.db"))
+        else:
+            storage = create_storage("mongo", mongo_url=os.environ["MONGO_URL"],
+                                     db_name=f"bench_{uuid.uuid4().hex}")
+        await storage.setup()
+        base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        tags = ["osint", "redteam", "web", "exploit", "malware", "forensics", "crypto", "cloud"]
+        ids = [str(uuid.uuid4()) for _ in range(posts)]
+
+        def post(i):
+            return {
+                "id": ids[i],
+                "title": f"Field notes #{i} on {tags[i % len(tags)]}",
+                "content": f"Write-up {i}: recon, initial access and lateral movement " * 5,
+                "tags": [tags[i % len(tags)], tags[(i * 3) % len(tags)]],
+                "author": "neo",
+                "author_id": f"user-{i % 50}",
+                "created_at": (base + timedelta(seconds=i)).isoformat(),
+            }
+
+        print(f"storage[{backend}]: {posts} posts")
+        try:
+            await timed("insert post", posts, lambda i: storage.posts.insert(post(i)))
+            await timed("get post", posts, lambda i: storage.posts.get(ids[i]))
+            await timed("list newest 100", 200, lambda i: storage.posts.list(limit=100))
+            await timed("list by tag", 200, lambda i: storage.posts.list(tag=tags[i % len(tags)], limit=100))
+            await timed("search", 200, lambda i: storage.posts.list(search=f"notes #{i}", limit=100))
+            await timed("top tags", 200, lambda i: storage.tags.top(20))
+        finally:
+            if backend == "mongo":
+                await storage.client.drop_database(storage.db.name)
+            await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="target", required=True)
+    ratelimit = sub.add_parser("ratelimit", help="in-memory limiter + admission overhead per request")
+    ratelimit.add_argument("--iterations", type=int, default=200_000)
+    ratelimit.add_argument("--keys", type=int, default=10_000)
+    storage = sub.add_parser("storage", help="throughput of common queries per storage backend")
+    storage.add_argument("--backend", action="append", choices=BACKENDS,
+                         help="repeat to compare backends (default: sqlite, plus mongo if MONGO_URL is set)")
+    storage.add_argument("--posts", type=int, default=2_000)
+    args = parser.parse_args()
+
+    if args.target == "ratelimit":
+        asyncio.run(bench_ratelimit(args.iterations, args.keys))
+    elif args.target == "storage":
+        backends = args.backend or (["sqlite", "mongo"] if os.environ.get("MONGO_URL") else ["sqlite"])
+        for backend in backends:
+            asyncio.run(bench_storage(backend, args.posts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Background job queue for post-write side effects.
+
+Handlers write the primary document, enqueue a job and return. Jobs are
+handed off durably through the storage backend's job store (the Mongo
+``jobs`` collection or the SQLite ``jobs`` table) and executed by
+in-process asyncio workers with at-least-once delivery, so job handlers
+must be idempotent.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    from storage import JobStore
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def version_stamp() -> str:
+    """Ordering token for recount writes; fixed width so strings compare in time order.
+
+    Take it *before* reading the value being recounted: the store only keeps a
+    write whose stamp is newer than the stored one, so an overlapping recount
+    that read earlier can never overwrite a fresher result.
+    """
+    return utcnow().isoformat(timespec="microseconds")
+
+
+def as_utc(value: datetime) -> datetime:
+    # Motor returns naive datetimes unless the client is tz_aware
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class JobQueue:
+    """In-process worker pool over a durable job store.
+
+    Failed jobs are retried with exponential backoff and dead-lettered once
+    ``max_attempts`` is exhausted. ``drain()`` stops new claims after the
+    backlog is empty (or the timeout expires) and waits for in-flight jobs.
+    """
+
+    def __init__(
+        self,
+        store: "JobStore",
+        workers: int = 2,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        visibility_timeout: float = 60.0,
+        poll_interval: float = 1.0,
+    ):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, JobHandler] = {}
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._draining = False
+        self._stopping = False
+        self._processed = 0
+        self._failed = 0
+        self._in_flight = 0
+
+    def handler(self, job_type: str):
+        def decorator(func: JobHandler) -> JobHandler:
+            self.handlers[job_type] = func
+            return func
+        return decorator
+
+    async def start(self, done_ttl_seconds: int = 86400):
+        await self.store.setup(done_ttl_seconds)
+        self._draining = False
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: dict,
+        idempotency_key: Optional[str] = None,
+        delay: float = 0,
+    ) -> str:
+        if job_type not in self.handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+        now = utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            "run_at": now + timedelta(seconds=delay),
+            "created_at": now,
+        }
+        if idempotency_key:
+            job["idempotency_key"] = idempotency_key
+        job_id = await self.store.insert(job)
+        self._wakeup.set()
+        return job_id
+
+    def backoff(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+
+    async def _worker(self, index: int):
+        while not self._stopping:
+            try:
+                now = utcnow()
+                job = await self.store.claim(now, now + timedelta(seconds=self.visibility_timeout))
+            except Exception:
+                logger.exception("Job worker %d failed to claim a job", index)
+                job = None
+
+            if job is None:
+                if self._draining:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._in_flight += 1
+            try:
+                await self._run(job)
+            except Exception:
+                # The store failed to record the outcome; the job is re-claimed once its lock expires
+                logger.exception("Job worker %d failed to record job %s", index, job["id"])
+            finally:
+                self._in_flight -= 1
+
+    async def _run(self, job: dict):
+        if job["attempts"] > self.max_attempts:
+            # Every attempt outlived its lock: the handler hangs or kills its worker
+            self._failed += 1
+            error = f"Lock expired on all {self.max_attempts} attempts"
+            logger.error("Job %s (%s) dead-lettered: %s", job["id"], job["type"], error)
+            await self.store.dead_letter(job["id"], error, utcnow())
+            return
+
+        handler = self.handlers.get(job["type"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job type '{job['type']}'")
+            await handler(job["payload"])
+        except Exception as e:
+            self._failed += 1
+            error = f"{type(e).__name__}: {e}"
+            if handler is None or job["attempts"] >= self.max_attempts:
+                logger.error("Job %s (%s) dead-lettered: %s", job["id"], job["type"], error)
+                await self.store.dead_letter(job["id"], error, utcnow())
+            else:
+                delay = self.backoff(job["attempts"])
+                logger.warning("Job %s (%s) failed, retrying in %.1fs: %s",
+                               job["id"], job["type"], delay, error)
+                await self.store.retry(job["id"], error, utcnow() + timedelta(seconds=delay))
+            return
+        self._processed += 1
+        await self.store.complete(job["id"], utcnow())
+
+    async def drain(self, timeout: float = 30.0):
+        """Finish the pending backlog and in-flight jobs, then stop the workers."""
+        self._draining = True
+        self._wakeup.set()
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        if pending:
+            # Out of time: stop claiming, leave unfinished jobs to be re-claimed
+            self._stopping = True
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning("Job queue drain timed out with %d worker(s) still busy", len(pending))
+        self._tasks = []
+
+    async def metrics(self) -> dict:
+        stats = await self.store.stats()
+        oldest = stats.pop("oldest_run_at")
+        lag = max(0.0, (utcnow() - oldest).total_seconds()) if oldest else 0.0
+        return {
+            **stats,
+            "lag_seconds": lag,
+            "in_flight": self._in_flight,
+            "processed": self._processed,
+            "failed": self._failed,
+            "workers": sum(not task.done() for task in self._tasks),
+            "draining": self._draining,
+        }
@@ -0,0 +1,130 @@
+"""Token-bucket rate limiting and concurrency admission control.
+
+Bucket state lives in memory per worker by default. ``MongoRateLimitStore``
+shares it between workers through a Mongo collection, at the cost of one
+round trip per check.
+"""
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Optional, Tuple
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request is shed; mapped to a 429/503 response with Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class MemoryRateLimitStore:
+    """Per-process buckets, evicting the least recently used key beyond ``max_keys``."""
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, capacity: float) -> Tuple[bool, float]:
+        now = self.clock()
+        buckets = self.buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            tokens = capacity
+            bucket = buckets[key] = [tokens, now]
+            if len(buckets) > self.max_keys:
+                buckets.popitem(last=False)
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            buckets.move_to_end(key)
+
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1 - tokens) / rate
+
+
+class MongoRateLimitStore:
+    """Buckets shared between workers, refilled and consumed in one atomic update."""
+
+    def __init__(self, collection, ttl_seconds: int = 3600):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    async def setup(self):
+        await self.collection.create_index("key", unique=True)
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def take(self, key: str, rate: float, capacity: float) -> Tuple[bool, float]:
+        # Imported here so the in-memory limiter does not need the Mongo driver
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        now = datetime.now(timezone.utc)
+        refilled = {"$min": [capacity, {"$add": [
+            {"$ifNull": ["$tokens", capacity]},
+            # Subtracting two dates yields milliseconds
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, rate / 1000]},
+        ]}]}
+        pipeline = [
+            {"$set": {"tokens": refilled, "updated_at": now,
+                      "expires_at": now + timedelta(seconds=self.ttl_seconds)}},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+        ]
+        try:
+            bucket = await self.collection.find_one_and_update(
+                {"key": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker inserted this new key first; the retry matches its document
+            bucket = await self.collection.find_one_and_update(
+                {"key": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        if bucket["allowed"]:
+            return True, 0.0
+        return False, (1 - bucket["tokens"]) / rate
+
+
+class RateLimiter:
+    """Token bucket refilling ``rate`` tokens per second up to ``capacity``."""
+
+    def __init__(self, store, rate: float, capacity: Optional[float] = None, name: str = "requests"):
+        self.store = store
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.name = name
+
+    @classmethod
+    def per_minute(cls, store, limit: int, name: str = "requests") -> "RateLimiter":
+        return cls(store, rate=limit / 60, capacity=limit, name=name)
+
+    async def hit(self, key: str):
+        allowed, retry_after = await self.store.take(key, self.rate, self.capacity)
+        if not allowed:
+            raise RateLimitExceeded(429, f"Too many {self.name}, slow down", retry_after)
+
+
+class AdmissionControl:
+    """Caps concurrent requests on a route, rejecting (not queueing) the overflow."""
+
+    def __init__(self, limit: int, retry_after: float = 1.0, name: str = "requests"):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.name = name
+        self.in_flight = 0
+
+    async def __aenter__(self):
+        if self.in_flight >= self.limit:
+            raise RateLimitExceeded(503, f"Server busy handling {self.name}, try again shortly", self.retry_after)
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
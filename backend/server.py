@@ -1,8 +1,9 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
@@ -13,14 +14,28 @@ from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import re
+import base64
+import binascii
+
+from jobs import JobQueue, version_stamp
+from ratelimit import (
+    AdmissionControl, MemoryRateLimitStore, MongoRateLimitStore, RateLimiter, RateLimitExceeded,
+)
+from storage import create_storage
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Storage backend (STORAGE_BACKEND=sqlite runs without a Mongo server)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+if STORAGE_BACKEND == 'sqlite':
+    storage = create_storage(
+        'sqlite',
+        path=os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'neonsec.db')),
+        pool_size=int(os.environ.get('SQLITE_POOL_SIZE', 4)),
+    )
+else:
+    storage = create_storage(STORAGE_BACKEND, mongo_url=os.environ['MONGO_URL'], db_name=os.environ['DB_NAME'])
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -31,6 +46,41 @@ JWT_SECRET = os.environ.get('JWT_SECRET')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', 60))
 
+# Background jobs for post-write side effects
+job_queue = JobQueue(
+    storage.jobs,
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', 5)),
+)
+JOB_DRAIN_TIMEOUT_SECONDS = float(os.environ.get('JOB_DRAIN_TIMEOUT_SECONDS', 30))
+
+# Rate limiting and admission control (RATE_LIMIT_BACKEND=mongo shares buckets between workers)
+if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == 'mongo':
+    if STORAGE_BACKEND != 'mongo':
+        raise RuntimeError("RATE_LIMIT_BACKEND=mongo requires STORAGE_BACKEND=mongo")
+    rate_limit_store = MongoRateLimitStore(storage.db.rate_limits)
+else:
+    rate_limit_store = MemoryRateLimitStore()
+# Number of reverse proxies in front of the app that append to X-Forwarded-For (0 = ignore the header).
+# Set it when deployed behind a proxy or ingress: with 0 every client gets the proxy's address and
+# shares one auth:ip: bucket, so a single noisy client locks everyone out of register and login.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+_warned_forwarded_for = False
+auth_ip_limiter = RateLimiter.per_minute(
+    rate_limit_store, int(os.environ.get('AUTH_IP_RATE_PER_MINUTE', 20)), name="authentication attempts")
+auth_account_limiter = RateLimiter.per_minute(
+    rate_limit_store, int(os.environ.get('AUTH_ACCOUNT_RATE_PER_MINUTE', 5)), name="authentication attempts")
+write_limiter = RateLimiter.per_minute(
+    rate_limit_store, int(os.environ.get('WRITE_RATE_PER_MINUTE', 30)), name="writes")
+# Per-route concurrency caps; bcrypt runs in the threadpool, so auth bursts cannot take over the worker
+AUTH_MAX_CONCURRENCY = int(os.environ.get('AUTH_MAX_CONCURRENCY', 4))
+WRITE_MAX_CONCURRENCY = int(os.environ.get('WRITE_MAX_CONCURRENCY', 32))
+register_admission = AdmissionControl(AUTH_MAX_CONCURRENCY, name="registrations")
+token_admission = AdmissionControl(AUTH_MAX_CONCURRENCY, name="token requests")
+login_admission = AdmissionControl(AUTH_MAX_CONCURRENCY, name="logins")
+post_admission = AdmissionControl(WRITE_MAX_CONCURRENCY, name="new posts")
+comment_admission = AdmissionControl(WRITE_MAX_CONCURRENCY, name="new comments")
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -43,6 +93,8 @@ class User(BaseModel):
     email: EmailStr
     hashed_password: str
     is_active: bool = True
+    post_count: int = 0
+    comment_count: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserCreate(BaseModel):
@@ -72,6 +124,13 @@ class UserResponse(BaseModel):
     is_active: bool
     created_at: datetime
 
+class UserProfile(BaseModel):
+    id: str
+    author: str
+    post_count: int
+    comment_count: int
+    created_at: datetime
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -93,6 +152,10 @@ class Post(BaseModel):
     author_id: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class PostPage(BaseModel):
+    items: List[Post]
+    next_cursor: Optional[str] = None
+
 class PostCreate(BaseModel):
     title: str
     content: str
@@ -139,6 +202,10 @@ class Comment(BaseModel):
     author_id: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class CommentPage(BaseModel):
+    items: List[Comment]
+    next_cursor: Optional[str] = None
+
 class CommentCreate(BaseModel):
     post_id: str
     content: str
@@ -169,17 +236,35 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_user_by_email(email: str):
-    user = await db.users.find_one({"email": email})
+    user = await storage.users.get_by_email(email)
     if user:
         return User(**parse_from_mongo(user))
     return None
 
 async def authenticate_user(email: str, password: str):
     user = await get_user_by_email(email)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not await run_in_threadpool(verify_password, password, user.hashed_password):
         return False
     return user
 
+def client_ip(request: Request) -> str:
+    global _warned_forwarded_for
+    # Clients control the left of X-Forwarded-For; each trusted proxy appends the
+    # peer it saw on the right, so count TRUSTED_PROXY_HOPS entries from the right
+    if TRUSTED_PROXY_HOPS:
+        forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return forwarded[-TRUSTED_PROXY_HOPS]
+    elif not _warned_forwarded_for and "x-forwarded-for" in request.headers:
+        _warned_forwarded_for = True
+        logger.warning("Received X-Forwarded-For but TRUSTED_PROXY_HOPS=0: rate limiting by the proxy's "
+                       "address, so all clients share one bucket. Set TRUSTED_PROXY_HOPS to the number of proxies.")
+    return request.client.host if request.client else "unknown"
+
+async def limit_auth_attempt(request: Request, account: str):
+    await auth_ip_limiter.hit(f"auth:ip:{client_ip(request)}")
+    await auth_account_limiter.hit(f"auth:account:{account.lower().strip()}")
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -220,34 +305,75 @@ def parse_from_mongo(item):
         item['created_at'] = datetime.fromisoformat(item['created_at'])
     return item
 
+def encode_cursor(item: dict) -> str:
+    return base64.urlsafe_b64encode(f"{item['created_at']}|{item['id']}".encode()).decode()
+
+def decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        created_at, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, item_id
+
+def next_cursor(items: List[dict], limit: int) -> Optional[str]:
+    # Must run before parse_from_mongo turns created_at into a datetime
+    return encode_cursor(items[-1]) if len(items) == limit else None
+
+# Background job handlers (must be idempotent: delivery is at-least-once)
+@job_queue.handler("tags.recount")
+async def recount_tags(payload: dict):
+    for tag in payload["tags"]:
+        version = version_stamp()
+        await storage.tags.set_count(tag, await storage.posts.count_with_tag(tag), version)
+
+def author_counters():
+    return {"posts": ("post_count", storage.posts), "comments": ("comment_count", storage.comments)}
+
+@job_queue.handler("authors.recount")
+async def recount_authors(payload: dict):
+    # "counts" picks which counters to refresh: "posts", "comments" (default both)
+    counters = author_counters()
+    for author_id in payload["author_ids"]:
+        for kind in payload.get("counts", list(counters)):
+            counter, repository = counters[kind]
+            version = version_stamp()
+            await storage.users.set_count(author_id, counter, await repository.count_by_author(author_id), version)
+
 # Authentication Routes
 auth_router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @auth_router.post("/register", response_model=UserResponse)
-async def register_user(user_data: UserCreate):
-    # Check if user already exists
-    existing_user = await get_user_by_email(user_data.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=400,
-            detail="Email already registered"
+async def register_user(user_data: UserCreate, request: Request):
+    # Admission first: a request shed with 503 must not spend the caller's rate-limit tokens
+    async with register_admission:
+        await limit_auth_attempt(request, user_data.email)
+        # Check if user already exists
+        existing_user = await get_user_by_email(user_data.email)
+        if existing_user:
+            raise HTTPException(
+                status_code=400,
+                detail="Email already registered"
+            )
+
+        # Create new user
+        hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
+        user = User(
+            email=user_data.email,
+            hashed_password=hashed_password
         )
-    
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
-    user = User(
-        email=user_data.email,
-        hashed_password=hashed_password
-    )
-    
-    user_dict = prepare_for_mongo(user.dict())
-    await db.users.insert_one(user_dict)
-    
+
+        user_dict = prepare_for_mongo(user.dict())
+        await storage.users.insert(user_dict)
+
     return UserResponse(**user.dict())
 
 @auth_router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await authenticate_user(form_data.username, form_data.password)
+async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    async with token_admission:
+        await limit_auth_attempt(request, form_data.username)
+        user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -261,8 +387,10 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @auth_router.post("/login", response_model=Token)
-async def login_user(user_data: UserLogin):
-    user = await authenticate_user(user_data.email, user_data.password)
+async def login_user(user_data: UserLogin, request: Request):
+    async with login_admission:
+        await limit_auth_attempt(request, user_data.email)
+        user = await authenticate_user(user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -285,35 +413,29 @@ async def root():
 
 @api_router.post("/posts", response_model=Post)
 async def create_post(post_data: PostCreate, current_user: User = Depends(get_current_user)):
-    post = Post(
-        **post_data.dict(),
-        author=current_user.email.split('@')[0],  # Use email username as author
-        author_id=current_user.id
-    )
-    post_dict = prepare_for_mongo(post.dict())
-    await db.posts.insert_one(post_dict)
+    async with post_admission:
+        await write_limiter.hit(f"write:account:{current_user.id}")
+        post = Post(
+            **post_data.dict(),
+            author=current_user.email.split('@')[0],  # Use email username as author
+            author_id=current_user.id
+        )
+        post_dict = prepare_for_mongo(post.dict())
+        await storage.posts.insert(post_dict)
+        if post.tags:
+            await job_queue.enqueue("tags.recount", {"tags": post.tags}, idempotency_key=f"post.created:{post.id}")
+        await job_queue.enqueue("authors.recount", {"author_ids": [current_user.id], "counts": ["posts"]},
+                                idempotency_key=f"post.created:{post.id}:authors")
     return post
 
 @api_router.get("/posts", response_model=List[Post])
 async def get_posts(tag: Optional[str] = None, search: Optional[str] = None):
-    query = {}
-    
-    if tag:
-        query["tags"] = {"$in": [tag]}
-    
-    if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"content": {"$regex": search, "$options": "i"}},
-            {"tags": {"$regex": search, "$options": "i"}}
-        ]
-    
-    posts = await db.posts.find(query).sort("created_at", -1).to_list(100)
+    posts = await storage.posts.list(tag=tag, search=search, limit=100)
     return [Post(**parse_from_mongo(post)) for post in posts]
 
 @api_router.get("/posts/{post_id}", response_model=Post)
 async def get_post(post_id: str):
-    post = await db.posts.find_one({"id": post_id})
+    post = await storage.posts.get(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     return Post(**parse_from_mongo(post))
@@ -321,7 +443,7 @@ async def get_post(post_id: str):
 @api_router.delete("/posts/{post_id}")
 async def delete_post(post_id: str, current_user: User = Depends(get_current_user)):
     # Find the post
-    post = await db.posts.find_one({"id": post_id})
+    post = await storage.posts.get(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
@@ -330,42 +452,84 @@ async def delete_post(post_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=403, detail="Not authorized to delete this post")
     
     # Delete post and associated comments
-    await db.posts.delete_one({"id": post_id})
-    await db.comments.delete_many({"post_id": post_id})
+    await storage.posts.delete(post_id)
+    comment_author_ids = await storage.comments.delete_for_post(post_id)
+    if post.get("tags"):
+        await job_queue.enqueue("tags.recount", {"tags": post["tags"]}, idempotency_key=f"post.deleted:{post_id}")
+    await job_queue.enqueue("authors.recount", {"author_ids": [current_user.id], "counts": ["posts"]},
+                            idempotency_key=f"post.deleted:{post_id}:authors")
+    if comment_author_ids:
+        await job_queue.enqueue("authors.recount", {"author_ids": comment_author_ids, "counts": ["comments"]},
+                                idempotency_key=f"post.deleted:{post_id}:commenters")
     return {"message": "Post deleted successfully"}
 
 @api_router.post("/comments", response_model=Comment)
 async def create_comment(comment_data: CommentCreate, current_user: User = Depends(get_current_user)):
-    # Verify post exists
-    post = await db.posts.find_one({"id": comment_data.post_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    comment = Comment(
-        **comment_data.dict(),
-        author=current_user.email.split('@')[0],  # Use email username as author
-        author_id=current_user.id
-    )
-    comment_dict = prepare_for_mongo(comment.dict())
-    await db.comments.insert_one(comment_dict)
+    async with comment_admission:
+        await write_limiter.hit(f"write:account:{current_user.id}")
+        # Verify post exists
+        post = await storage.posts.get(comment_data.post_id)
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        comment = Comment(
+            **comment_data.dict(),
+            author=current_user.email.split('@')[0],  # Use email username as author
+            author_id=current_user.id
+        )
+        comment_dict = prepare_for_mongo(comment.dict())
+        await storage.comments.insert(comment_dict)
+        await job_queue.enqueue("authors.recount", {"author_ids": [current_user.id], "counts": ["comments"]},
+                                idempotency_key=f"comment.created:{comment.id}")
     return comment
 
 @api_router.get("/comments/{post_id}", response_model=List[Comment])
 async def get_comments(post_id: str):
-    comments = await db.comments.find({"post_id": post_id}).sort("created_at", 1).to_list(100)
+    comments = await storage.comments.list_for_post(post_id, limit=100)
     return [Comment(**parse_from_mongo(comment)) for comment in comments]
 
+@api_router.get("/users/{user_id}", response_model=UserProfile)
+async def get_user_profile(user_id: str):
+    user = await storage.users.get(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    for counter, repository in author_counters().values():
+        if counter not in user:
+            # Accounts created before counters existed: fill them in once
+            version = version_stamp()
+            user[counter] = await repository.count_by_author(user_id)
+            await storage.users.set_count(user_id, counter, user[counter], version)
+    user = parse_from_mongo(user)
+    return UserProfile(**user, author=user["email"].split('@')[0])
+
+@api_router.get("/users/{user_id}/posts", response_model=PostPage)
+async def get_user_posts(user_id: str, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    posts = await storage.posts.list_by_author(user_id, before=decode_cursor(cursor), limit=limit)
+    page_cursor = next_cursor(posts, limit)
+    return PostPage(items=[Post(**parse_from_mongo(post)) for post in posts], next_cursor=page_cursor)
+
+@api_router.get("/users/{user_id}/comments", response_model=CommentPage)
+async def get_user_comments(user_id: str, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    comments = await storage.comments.list_by_author(user_id, before=decode_cursor(cursor), limit=limit)
+    page_cursor = next_cursor(comments, limit)
+    return CommentPage(items=[Comment(**parse_from_mongo(comment)) for comment in comments], next_cursor=page_cursor)
+
 @api_router.get("/tags")
 async def get_popular_tags():
-    pipeline = [
-        {"$unwind": "$tags"},
-        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 20}
-    ]
-    
-    tags = await db.posts.aggregate(pipeline).to_list(20)
-    return [{"tag": tag["_id"], "count": tag["count"]} for tag in tags]
+    # Counters are maintained by the tags.recount job instead of aggregating all posts
+    return await storage.tags.top(20)
+
+@api_router.get("/metrics/jobs")
+async def get_job_metrics():
+    return await job_queue.metrics()
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # Include routers
 api_router.include_router(auth_router)
@@ -386,6 +550,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_services():
+    await storage.setup()
+    await storage.tags.backfill()
+    if isinstance(rate_limit_store, MongoRateLimitStore):
+        await rate_limit_store.setup()
+    await job_queue.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await job_queue.drain(timeout=JOB_DRAIN_TIMEOUT_SECONDS)
+    await storage.close()
\ No newline at end of file
@@ -0,0 +1,31 @@
+"""Pluggable storage layer: repositories for users, posts, comments, tags and jobs."""
+from .base import (
+    USER_COUNTERS, CommentRepository, Cursor, JobStore, PostRepository, Storage, TagRepository, UserRepository,
+)
+
+BACKENDS = ("mongo", "sqlite")
+
+
+def create_storage(backend: str, **options) -> Storage:
+    """Build a storage backend; each backend's driver is only imported when selected."""
+    if backend == "mongo":
+        from .mongo import MongoStorage
+        return MongoStorage(options["mongo_url"], options["db_name"])
+    if backend == "sqlite":
+        from .sqlite import SQLiteStorage
+        return SQLiteStorage(options["path"], pool_size=options.get("pool_size", 4))
+    raise ValueError(f"Unknown storage backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+
+
+__all__ = [
+    "BACKENDS",
+    "CommentRepository",
+    "Cursor",
+    "JobStore",
+    "PostRepository",
+    "Storage",
+    "TagRepository",
+    "USER_COUNTERS",
+    "UserRepository",
+    "create_storage",
+]
@@ -0,0 +1,138 @@
+"""Repository interfaces shared by every storage backend.
+
+Records are plain dicts shaped like the API models, with ``created_at``
+stored as an ISO-8601 string (see ``prepare_for_mongo`` in server.py).
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+# Keyset pagination position: (created_at, id) of the last record already seen
+Cursor = Tuple[str, str]
+
+# Denormalized per-author counters on the user record, each versioned on its own
+USER_COUNTERS = ("post_count", "comment_count")
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    async def insert(self, user: dict) -> None: ...
+
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def get_by_email(self, email: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def set_count(self, user_id: str, counter: str, count: int, version: str) -> None:
+        """Store one of ``USER_COUNTERS`` unless a newer ``version`` of it is already stored."""
+
+
+class PostRepository(ABC):
+    @abstractmethod
+    async def insert(self, post: dict) -> None: ...
+
+    @abstractmethod
+    async def get(self, post_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def list(self, tag: Optional[str] = None, search: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Newest first, optionally filtered by tag and/or a case-insensitive search term.
+
+        ``search`` is a literal substring: regex metacharacters match themselves.
+        """
+
+    @abstractmethod
+    async def delete(self, post_id: str) -> bool: ...
+
+    @abstractmethod
+    async def count_with_tag(self, tag: str) -> int: ...
+
+    @abstractmethod
+    async def list_by_author(self, author_id: str, before: Optional[Cursor] = None, limit: int = 20) -> List[dict]:
+        """Newest first, resuming strictly below ``before`` in (created_at, id) order."""
+
+    @abstractmethod
+    async def count_by_author(self, author_id: str) -> int: ...
+
+
+class CommentRepository(ABC):
+    @abstractmethod
+    async def insert(self, comment: dict) -> None: ...
+
+    @abstractmethod
+    async def list_for_post(self, post_id: str, limit: int = 100) -> List[dict]:
+        """Oldest first."""
+
+    @abstractmethod
+    async def delete_for_post(self, post_id: str) -> List[str]:
+        """Returns the distinct author ids of the comments actually deleted."""
+
+    @abstractmethod
+    async def list_by_author(self, author_id: str, before: Optional[Cursor] = None, limit: int = 20) -> List[dict]:
+        """Newest first, resuming strictly below ``before`` in (created_at, id) order."""
+
+    @abstractmethod
+    async def count_by_author(self, author_id: str) -> int: ...
+
+
+class TagRepository(ABC):
+    @abstractmethod
+    async def set_count(self, tag: str, count: int, version: str) -> None:
+        """Store the post count for a tag unless a newer ``version`` is already stored.
+
+        Zero counts are kept (and hidden from ``top``) so their version still
+        guards against late, stale recounts.
+        """
+
+    @abstractmethod
+    async def top(self, limit: int = 20) -> List[dict]:
+        """``{"tag", "count"}`` rows with a non-zero count, most used first."""
+
+    @abstractmethod
+    async def backfill(self) -> None:
+        """Rebuild the counters from the posts if none are stored yet."""
+
+
+class JobStore(ABC):
+    """Durable storage behind ``jobs.JobQueue``."""
+
+    @abstractmethod
+    async def setup(self, done_ttl_seconds: int) -> None: ...
+
+    @abstractmethod
+    async def insert(self, job: dict) -> str:
+        """Store a job, returning the id of the existing job if its idempotency key is taken."""
+
+    @abstractmethod
+    async def claim(self, now: datetime, lock_until: datetime) -> Optional[dict]:
+        """Lock the next due job (or one whose lock expired) and bump its attempts."""
+
+    @abstractmethod
+    async def complete(self, job_id: str, now: datetime) -> None: ...
+
+    @abstractmethod
+    async def retry(self, job_id: str, error: str, run_at: datetime) -> None: ...
+
+    @abstractmethod
+    async def dead_letter(self, job_id: str, error: str, now: datetime) -> None: ...
+
+    @abstractmethod
+    async def stats(self) -> dict:
+        """``depth``, ``dead`` and ``oldest_run_at`` (aware datetime or None)."""
+
+
+class Storage(ABC):
+    users: UserRepository
+    posts: PostRepository
+    comments: CommentRepository
+    tags: TagRepository
+    jobs: JobStore
+
+    @abstractmethod
+    async def setup(self) -> None:
+        """Create schema and indexes."""
+
+    @abstractmethod
+    async def close(self) -> None: ...
@@ -0,0 +1,248 @@
+"""MongoDB storage backend on Motor."""
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from jobs import DEAD, DONE, PENDING, RUNNING, as_utc
+from .base import (
+    USER_COUNTERS, CommentRepository, Cursor, JobStore, PostRepository, Storage, TagRepository, UserRepository,
+)
+
+# Never hand Mongo's ObjectId back to the API models
+NO_ID = {"_id": 0}
+NEWEST_FIRST = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+
+def author_query(author_id: str, before: Optional[Cursor]) -> dict:
+    query = {"author_id": author_id}
+    if before:
+        created_at, record_id = before
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": record_id}},
+        ]
+    return query
+
+
+class MongoUserRepository(UserRepository):
+    def __init__(self, db):
+        self.db = db
+
+    async def insert(self, user: dict) -> None:
+        await self.db.users.insert_one(dict(user))
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return await self.db.users.find_one({"id": user_id}, NO_ID)
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self.db.users.find_one({"email": email}, NO_ID)
+
+    async def set_count(self, user_id: str, counter: str, count: int, version: str) -> None:
+        if counter not in USER_COUNTERS:
+            raise ValueError(f"Unknown user counter '{counter}'")
+        version_field = f"{counter}_version"
+        await self.db.users.update_one(
+            {"id": user_id,
+             "$or": [{version_field: {"$lt": version}}, {version_field: {"$exists": False}}]},
+            {"$set": {counter: count, version_field: version}},
+        )
+
+
+class MongoPostRepository(PostRepository):
+    def __init__(self, db):
+        self.db = db
+
+    async def insert(self, post: dict) -> None:
+        await self.db.posts.insert_one(dict(post))
+
+    async def get(self, post_id: str) -> Optional[dict]:
+        return await self.db.posts.find_one({"id": post_id}, NO_ID)
+
+    async def list(self, tag: Optional[str] = None, search: Optional[str] = None, limit: int = 100) -> List[dict]:
+        query = {}
+
+        if tag:
+            query["tags"] = {"$in": [tag]}
+
+        if search:
+            # Literal substring, like the SQLite backend; never a user-supplied regex
+            pattern = re.escape(search)
+            query["$or"] = [
+                {"title": {"$regex": pattern, "$options": "i"}},
+                {"content": {"$regex": pattern, "$options": "i"}},
+                {"tags": {"$regex": pattern, "$options": "i"}}
+            ]
+
+        return await self.db.posts.find(query, NO_ID).sort("created_at", -1).to_list(limit)
+
+    async def delete(self, post_id: str) -> bool:
+        result = await self.db.posts.delete_one({"id": post_id})
+        return result.deleted_count > 0
+
+    async def count_with_tag(self, tag: str) -> int:
+        return await self.db.posts.count_documents({"tags": tag})
+
+    async def list_by_author(self, author_id: str, before: Optional[Cursor] = None, limit: int = 20) -> List[dict]:
+        return await self.db.posts.find(author_query(author_id, before), NO_ID).sort(NEWEST_FIRST).to_list(limit)
+
+    async def count_by_author(self, author_id: str) -> int:
+        return await self.db.posts.count_documents({"author_id": author_id})
+
+
+class MongoCommentRepository(CommentRepository):
+    def __init__(self, db):
+        self.db = db
+
+    async def insert(self, comment: dict) -> None:
+        await self.db.comments.insert_one(dict(comment))
+
+    async def list_for_post(self, post_id: str, limit: int = 100) -> List[dict]:
+        return await self.db.comments.find({"post_id": post_id}, NO_ID).sort("created_at", 1).to_list(limit)
+
+    async def delete_for_post(self, post_id: str) -> List[str]:
+        # Delete exactly the comments read, repeating for any added meanwhile,
+        # so every deleted comment's author is reported
+        author_ids = set()
+        while True:
+            comments = await self.db.comments.find(
+                {"post_id": post_id}, {"_id": 0, "id": 1, "author_id": 1}
+            ).to_list(None)
+            if not comments:
+                return sorted(author_ids)
+            await self.db.comments.delete_many({"id": {"$in": [comment["id"] for comment in comments]}})
+            author_ids.update(comment["author_id"] for comment in comments if comment.get("author_id"))
+
+    async def list_by_author(self, author_id: str, before: Optional[Cursor] = None, limit: int = 20) -> List[dict]:
+        return await self.db.comments.find(author_query(author_id, before), NO_ID).sort(NEWEST_FIRST).to_list(limit)
+
+    async def count_by_author(self, author_id: str) -> int:
+        return await self.db.comments.count_documents({"author_id": author_id})
+
+
+class MongoTagRepository(TagRepository):
+    def __init__(self, db):
+        self.db = db
+
+    async def set_count(self, tag: str, count: int, version: str) -> None:
+        try:
+            await self.db.tag_counts.update_one(
+                {"tag": tag, "$or": [{"version": {"$lt": version}}, {"version": {"$exists": False}}]},
+                {"$set": {"count": count, "version": version}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # The tag exists with a newer version, so the upsert tried to insert
+            pass
+
+    async def top(self, limit: int = 20) -> List[dict]:
+        tags = await self.db.tag_counts.find({"count": {"$gt": 0}}, NO_ID).sort("count", -1).to_list(limit)
+        return [{"tag": tag["tag"], "count": tag["count"]} for tag in tags]
+
+    async def backfill(self) -> None:
+        if await self.db.tag_counts.estimated_document_count():
+            return
+        pipeline = [
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+        ]
+        async for row in self.db.posts.aggregate(pipeline):
+            # Lowest possible version: any real recount supersedes the backfill
+            await self.set_count(row["_id"], row["count"], version="")
+
+
+class MongoJobStore(JobStore):
+    """Durable job storage on the ``jobs`` collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def setup(self, done_ttl_seconds: int) -> None:
+        await self.collection.create_index([("status", ASCENDING), ("run_at", ASCENDING)])
+        await self.collection.create_index("idempotency_key", unique=True, sparse=True)
+        await self.collection.create_index("finished_at", expireAfterSeconds=done_ttl_seconds)
+
+    async def insert(self, job: dict) -> str:
+        try:
+            await self.collection.insert_one(dict(job))
+            return job["id"]
+        except DuplicateKeyError:
+            existing = await self.collection.find_one(
+                {"idempotency_key": job["idempotency_key"]}, {"id": 1}
+            )
+            return existing["id"] if existing else job["id"]
+
+    async def claim(self, now: datetime, lock_until: datetime) -> Optional[dict]:
+        # Pending jobs that are due, or running jobs whose worker died
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "run_at": {"$lte": now}},
+                {"status": RUNNING, "locked_until": {"$lte": now}},
+            ]},
+            {"$set": {"status": RUNNING, "locked_until": lock_until}, "$inc": {"attempts": 1}},
+            projection=NO_ID,
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def complete(self, job_id: str, now: datetime) -> None:
+        await self.collection.update_one(
+            {"id": job_id},
+            {"$set": {"status": DONE, "finished_at": now}, "$unset": {"locked_until": ""}},
+        )
+
+    async def retry(self, job_id: str, error: str, run_at: datetime) -> None:
+        await self.collection.update_one(
+            {"id": job_id},
+            {"$set": {"status": PENDING, "run_at": run_at, "last_error": error},
+             "$unset": {"locked_until": ""}},
+        )
+
+    async def dead_letter(self, job_id: str, error: str, now: datetime) -> None:
+        # Dead jobs are kept (no finished_at, so no TTL) for inspection and replay
+        await self.collection.update_one(
+            {"id": job_id},
+            {"$set": {"status": DEAD, "last_error": error, "dead_at": now},
+             "$unset": {"locked_until": ""}},
+        )
+
+    async def stats(self) -> dict:
+        depth = await self.collection.count_documents({"status": {"$in": [PENDING, RUNNING]}})
+        dead = await self.collection.count_documents({"status": DEAD})
+        oldest = await self.collection.find_one(
+            {"status": PENDING}, {"run_at": 1}, sort=[("run_at", ASCENDING)]
+        )
+        return {
+            "depth": depth,
+            "dead": dead,
+            "oldest_run_at": as_utc(oldest["run_at"]) if oldest else None,
+        }
+
+
+class MongoStorage(Storage):
+    def __init__(self, mongo_url: str, db_name: str):
+        self.client = AsyncIOMotorClient(mongo_url)
+        self.db = self.client[db_name]
+        self.users = MongoUserRepository(self.db)
+        self.posts = MongoPostRepository(self.db)
+        self.comments = MongoCommentRepository(self.db)
+        self.tags = MongoTagRepository(self.db)
+        self.jobs = MongoJobStore(self.db.jobs)
+
+    async def setup(self) -> None:
+        await self.db.users.create_index("id")
+        await self.db.users.create_index("email")
+        await self.db.posts.create_index("id")
+        await self.db.posts.create_index([("created_at", DESCENDING)])
+        await self.db.posts.create_index("tags")
+        await self.db.posts.create_index([("author_id", ASCENDING), *NEWEST_FIRST])
+        await self.db.comments.create_index([("post_id", ASCENDING), ("created_at", ASCENDING)])
+        await self.db.comments.create_index([("author_id", ASCENDING), *NEWEST_FIRST])
+        await self.db.tag_counts.create_index("tag", unique=True)
+        await self.db.tag_counts.create_index([("count", DESCENDING)])
+
+    async def close(self) -> None:
+        self.client.close()
@@ -0,0 +1,467 @@
+"""Embedded SQLite storage backend for single-node deployments and CI.
+
+The database runs in WAL mode so readers never block the writer. Every query
+runs on a small thread pool, each thread owning its own connection, so the
+event loop never waits on disk. Post search uses an FTS5 trigram index for
+terms of three or more characters and a scan for shorter ones; both match a
+case-insensitive literal substring of the title, the content or a single tag,
+like the Mongo backend.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional
+
+from jobs import DEAD, DONE, PENDING, RUNNING
+from .base import (
+    USER_COUNTERS, CommentRepository, Cursor, JobStore, PostRepository, Storage, TagRepository, UserRepository,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    author_id TEXT,
+    created_at TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_created_at ON posts (created_at);
+CREATE INDEX IF NOT EXISTS posts_author_id_created_at ON posts (author_id, created_at, id);
+
+-- created_at is copied in so "newest posts with tag X" is one index range read
+CREATE TABLE IF NOT EXISTS post_tags (
+    tag TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    PRIMARY KEY (tag, created_at, post_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS post_tags_post_id ON post_tags (post_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5 (
+    id UNINDEXED, title, content, tags, tokenize = 'trigram'
+);
+
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    post_id TEXT NOT NULL,
+    author_id TEXT,
+    created_at TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_post_id_created_at ON comments (post_id, created_at);
+CREATE INDEX IF NOT EXISTS comments_author_id_created_at ON comments (author_id, created_at, id);
+
+CREATE TABLE IF NOT EXISTS tag_counts (
+    tag TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    version TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS tag_counts_count ON tag_counts (count);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at TEXT NOT NULL,
+    locked_until TEXT,
+    idempotency_key TEXT UNIQUE,
+    created_at TEXT NOT NULL,
+    finished_at TEXT,
+    dead_at TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_run_at ON jobs (status, run_at);
+CREATE INDEX IF NOT EXISTS jobs_status_locked_until ON jobs (status, locked_until);
+CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+"""
+
+
+def to_iso(value: datetime) -> str:
+    # Fixed-width UTC timestamps so text comparison orders them correctly
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def from_iso(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+# Joins a post's tags in the FTS index; no search term contains it, so no match spans two tags
+TAG_SEPARATOR = "\x1f"
+
+
+def unicode_lower(value: Optional[str]) -> Optional[str]:
+    # SQLite's lower() only folds ASCII
+    return value.lower() if value is not None else None
+
+
+def list_by_author(conn: sqlite3.Connection, table: str, author_id: str, before: Optional[Cursor], limit: int):
+    # Row-value comparison keeps this a single range scan on (author_id, created_at, id)
+    sql = f"SELECT doc FROM {table} WHERE author_id = ?"
+    params = [author_id]
+    if before:
+        sql += " AND (created_at, id) < (?, ?)"
+        params.extend(before)
+    sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    return [json.loads(row["doc"]) for row in conn.execute(sql, (*params, limit))]
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    # IMMEDIATE takes the write lock up front instead of failing on upgrade
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SQLitePool:
+    """Thread pool where each thread lazily opens its own connection."""
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="sqlite")
+        self.local = threading.local()
+        self.connections: List[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            conn.create_function("unicode_lower", 1, unicode_lower, deterministic=True)
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: func(self.connection(), *args))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+
+
+class SQLiteUserRepository(UserRepository):
+    def __init__(self, pool: SQLitePool):
+        self.pool = pool
+
+    async def insert(self, user: dict) -> None:
+        def insert(conn):
+            conn.execute(
+                "INSERT INTO users (id, email, doc) VALUES (?, ?, ?)",
+                (user["id"], user["email"], json.dumps(user)),
+            )
+        await self.pool.run(insert)
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        def get(conn):
+            row = conn.execute("SELECT doc FROM users WHERE id = ?", (user_id,)).fetchone()
+            return json.loads(row["doc"]) if row else None
+        return await self.pool.run(get)
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        def get(conn):
+            row = conn.execute("SELECT doc FROM users WHERE email = ? LIMIT 1", (email,)).fetchone()
+            return json.loads(row["doc"]) if row else None
+        return await self.pool.run(get)
+
+    async def set_count(self, user_id: str, counter: str, count: int, version: str) -> None:
+        if counter not in USER_COUNTERS:
+            raise ValueError(f"Unknown user counter '{counter}'")
+        counter_path, version_path = f"$.{counter}", f"$.{counter}_version"
+
+        def store(conn):
+            conn.execute(
+                "UPDATE users SET doc = json_set(doc, ?, ?, ?, ?)"
+                " WHERE id = ? AND COALESCE(json_extract(doc, ?), '') < ?",
+                (counter_path, count, version_path, version, user_id, version_path, version),
+            )
+        await self.pool.run(store)
+
+
+class SQLitePostRepository(PostRepository):
+    def __init__(self, pool: SQLitePool):
+        self.pool = pool
+
+    async def insert(self, post: dict) -> None:
+        def insert(conn):
+            with transaction(conn):
+                conn.execute(
+                    "INSERT INTO posts (id, author_id, created_at, doc) VALUES (?, ?, ?, ?)",
+                    (post["id"], post.get("author_id"), post["created_at"], json.dumps(post)),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO post_tags (tag, created_at, post_id) VALUES (?, ?, ?)",
+                    [(tag, post["created_at"], post["id"]) for tag in post.get("tags", [])],
+                )
+                conn.execute(
+                    "INSERT INTO posts_fts (id, title, content, tags) VALUES (?, ?, ?, ?)",
+                    (post["id"], post["title"], post["content"], TAG_SEPARATOR.join(post.get("tags", []))),
+                )
+        await self.pool.run(insert)
+
+    async def get(self, post_id: str) -> Optional[dict]:
+        def get(conn):
+            row = conn.execute("SELECT doc FROM posts WHERE id = ?", (post_id,)).fetchone()
+            return json.loads(row["doc"]) if row else None
+        return await self.pool.run(get)
+
+    async def list(self, tag: Optional[str] = None, search: Optional[str] = None, limit: int = 100) -> List[dict]:
+        if tag:
+            # Walk the tag's (created_at) index range newest first
+            source = "post_tags t JOIN posts p ON p.id = t.post_id"
+            clauses, params, order = ["t.tag = ?"], [tag], "t.created_at"
+        else:
+            source, clauses, params, order = "posts p", [], [], "p.created_at"
+
+        if search and TAG_SEPARATOR in search:
+            clauses.append("0")  # could only match across two tags
+        elif search and len(search) >= 3:
+            clauses.append("p.id IN (SELECT id FROM posts_fts WHERE posts_fts MATCH ?)")
+            params.append('"' + search.replace('"', '""') + '"')
+        elif search:
+            # Too short for a trigram: scan with the same Unicode case folding
+            clauses.append(
+                "(instr(unicode_lower(json_extract(p.doc, '$.title')), ?)"
+                " OR instr(unicode_lower(json_extract(p.doc, '$.content')), ?)"
+                " OR p.id IN (SELECT post_id FROM post_tags WHERE instr(unicode_lower(tag), ?)))"
+            )
+            params.extend([search.lower()] * 3)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT p.doc FROM {source} {where} ORDER BY {order} DESC LIMIT ?"
+
+        def fetch(conn):
+            return [json.loads(row["doc"]) for row in conn.execute(sql, (*params, limit))]
+        return await self.pool.run(fetch)
+
+    async def delete(self, post_id: str) -> bool:
+        def delete(conn):
+            with transaction(conn):
+                deleted = conn.execute("DELETE FROM posts WHERE id = ?", (post_id,)).rowcount
+                conn.execute("DELETE FROM post_tags WHERE post_id = ?", (post_id,))
+                conn.execute("DELETE FROM posts_fts WHERE id = ?", (post_id,))
+            return deleted > 0
+        return await self.pool.run(delete)
+
+    async def count_with_tag(self, tag: str) -> int:
+        def count(conn):
+            return conn.execute("SELECT COUNT(*) FROM post_tags WHERE tag = ?", (tag,)).fetchone()[0]
+        return await self.pool.run(count)
+
+    async def list_by_author(self, author_id: str, before: Optional[Cursor] = None, limit: int = 20) -> List[dict]:
+        return await self.pool.run(list_by_author, "posts", author_id, before, limit)
+
+    async def count_by_author(self, author_id: str) -> int:
+        def count(conn):
+            return conn.execute("SELECT COUNT(*) FROM posts WHERE author_id = ?", (author_id,)).fetchone()[0]
+        return await self.pool.run(count)
+
+
+class SQLiteCommentRepository(CommentRepository):
+    def __init__(self, pool: SQLitePool):
+        self.pool = pool
+
+    async def insert(self, comment: dict) -> None:
+        def insert(conn):
+            conn.execute(
+                "INSERT INTO comments (id, post_id, author_id, created_at, doc) VALUES (?, ?, ?, ?, ?)",
+                (comment["id"], comment["post_id"], comment.get("author_id"), comment["created_at"],
+                 json.dumps(comment)),
+            )
+        await self.pool.run(insert)
+
+    async def list_for_post(self, post_id: str, limit: int = 100) -> List[dict]:
+        def fetch(conn):
+            rows = conn.execute(
+                "SELECT doc FROM comments WHERE post_id = ? ORDER BY created_at ASC LIMIT ?",
+                (post_id, limit),
+            )
+            return [json.loads(row["doc"]) for row in rows]
+        return await self.pool.run(fetch)
+
+    async def delete_for_post(self, post_id: str) -> List[str]:
+        def delete(conn):
+            # The write lock is held from the read, so no comment slips in between
+            with transaction(conn):
+                rows = conn.execute(
+                    "SELECT DISTINCT author_id FROM comments WHERE post_id = ? AND author_id IS NOT NULL"
+                    " ORDER BY author_id",
+                    (post_id,),
+                )
+                author_ids = [row["author_id"] for row in rows]
+                conn.execute("DELETE FROM comments WHERE post_id = ?", (post_id,))
+            return author_ids
+        return await self.pool.run(delete)
+
+    async def list_by_author(self, author_id: str, before: Optional[Cursor] = None, limit: int = 20) -> List[dict]:
+        return await self.pool.run(list_by_author, "comments", author_id, before, limit)
+
+    async def count_by_author(self, author_id: str) -> int:
+        def count(conn):
+            return conn.execute("SELECT COUNT(*) FROM comments WHERE author_id = ?", (author_id,)).fetchone()[0]
+        return await self.pool.run(count)
+
+
+class SQLiteTagRepository(TagRepository):
+    def __init__(self, pool: SQLitePool):
+        self.pool = pool
+
+    async def set_count(self, tag: str, count: int, version: str) -> None:
+        def store(conn):
+            conn.execute(
+                "INSERT INTO tag_counts (tag, count, version) VALUES (?, ?, ?)"
+                " ON CONFLICT (tag) DO UPDATE SET count = excluded.count, version = excluded.version"
+                " WHERE excluded.version > tag_counts.version",
+                (tag, count, version),
+            )
+        await self.pool.run(store)
+
+    async def top(self, limit: int = 20) -> List[dict]:
+        def fetch(conn):
+            rows = conn.execute("SELECT tag, count FROM tag_counts WHERE count > 0 ORDER BY count DESC LIMIT ?", (limit,))
+            return [{"tag": row["tag"], "count": row["count"]} for row in rows]
+        return await self.pool.run(fetch)
+
+    async def backfill(self) -> None:
+        def rebuild(conn):
+            with transaction(conn):
+                if conn.execute("SELECT 1 FROM tag_counts LIMIT 1").fetchone():
+                    return
+                conn.execute(
+                    "INSERT INTO tag_counts (tag, count) SELECT tag, COUNT(*) FROM post_tags GROUP BY tag"
+                )
+        await self.pool.run(rebuild)
+
+
+class SQLiteJobStore(JobStore):
+    """Durable job storage on the ``jobs`` table."""
+
+    def __init__(self, pool: SQLitePool):
+        self.pool = pool
+        self.done_ttl = timedelta(days=1)
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        for field in ("run_at", "locked_until", "created_at", "finished_at", "dead_at"):
+            job[field] = from_iso(job[field])
+        return job
+
+    async def setup(self, done_ttl_seconds: int) -> None:
+        self.done_ttl = timedelta(seconds=done_ttl_seconds)
+
+    async def insert(self, job: dict) -> str:
+        def insert(conn):
+            cursor = conn.execute(
+                "INSERT INTO jobs (id, type, payload, status, attempts, run_at, idempotency_key, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (idempotency_key) DO NOTHING",
+                (job["id"], job["type"], json.dumps(job["payload"]), job["status"], job["attempts"],
+                 to_iso(job["run_at"]), job.get("idempotency_key"), to_iso(job["created_at"])),
+            )
+            if cursor.rowcount:
+                return job["id"]
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE idempotency_key = ?", (job["idempotency_key"],)
+            ).fetchone()
+            return row["id"] if row else job["id"]
+        return await self.pool.run(insert)
+
+    async def claim(self, now: datetime, lock_until: datetime) -> Optional[dict]:
+        def claim(conn):
+            with transaction(conn):
+                # Pending jobs that are due, or running jobs whose worker died
+                row = conn.execute(
+                    "SELECT id FROM ("
+                    " SELECT id, run_at FROM jobs WHERE status = ? AND run_at <= ?"
+                    " UNION ALL"
+                    " SELECT id, run_at FROM jobs WHERE status = ? AND locked_until <= ?"
+                    ") ORDER BY run_at LIMIT 1",
+                    (PENDING, to_iso(now), RUNNING, to_iso(now)),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, locked_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, to_iso(lock_until), row["id"]),
+                )
+                return self._job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+        return await self.pool.run(claim)
+
+    async def complete(self, job_id: str, now: datetime) -> None:
+        def complete(conn):
+            with transaction(conn):
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, locked_until = NULL WHERE id = ?",
+                    (DONE, to_iso(now), job_id),
+                )
+                # Stands in for the Mongo TTL index on finished_at
+                conn.execute("DELETE FROM jobs WHERE finished_at < ?", (to_iso(now - self.done_ttl),))
+        await self.pool.run(complete)
+
+    async def retry(self, job_id: str, error: str, run_at: datetime) -> None:
+        def retry(conn):
+            conn.execute(
+                "UPDATE jobs SET status = ?, run_at = ?, last_error = ?, locked_until = NULL WHERE id = ?",
+                (PENDING, to_iso(run_at), error, job_id),
+            )
+        await self.pool.run(retry)
+
+    async def dead_letter(self, job_id: str, error: str, now: datetime) -> None:
+        def dead_letter(conn):
+            conn.execute(
+                "UPDATE jobs SET status = ?, last_error = ?, dead_at = ?, locked_until = NULL WHERE id = ?",
+                (DEAD, error, to_iso(now), job_id),
+            )
+        await self.pool.run(dead_letter)
+
+    async def stats(self) -> dict:
+        def stats(conn):
+            depth = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (PENDING, RUNNING)
+            ).fetchone()[0]
+            dead = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (DEAD,)).fetchone()[0]
+            oldest = conn.execute("SELECT MIN(run_at) FROM jobs WHERE status = ?", (PENDING,)).fetchone()[0]
+            return {"depth": depth, "dead": dead, "oldest_run_at": from_iso(oldest)}
+        return await self.pool.run(stats)
+
+
+class SQLiteStorage(Storage):
+    def __init__(self, path: str, pool_size: int = 4):
+        self.pool = SQLitePool(path, pool_size)
+        self.users = SQLiteUserRepository(self.pool)
+        self.posts = SQLitePostRepository(self.pool)
+        self.comments = SQLiteCommentRepository(self.pool)
+        self.tags = SQLiteTagRepository(self.pool)
+        self.jobs = SQLiteJobStore(self.pool)
+
+    async def setup(self) -> None:
+        await self.pool.run(lambda conn: conn.executescript(SCHEMA))
+
+    async def close(self) -> None:
+        self.pool.close()
@@ -0,0 +1,50 @@
+import asyncio
+import importlib
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from storage import create_storage  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """The FastAPI app module, configured for the SQLite backend (no Mongo needed)."""
+    pytest.importorskip("fastapi")
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = str(tmp_path_factory.mktemp("server") / "server.db")
+    os.environ.setdefault("JWT_SECRET", "test-secret")
+    return importlib.import_module("server")
+
+
+def make_storage(backend, tmp_path):
+    if backend == "sqlite":
+        return create_storage("sqlite", path=str(tmp_path / "storage.db"), pool_size=2)
+    if not os.environ.get("MONGO_URL"):
+        pytest.skip("MONGO_URL not set")
+    return create_storage("mongo", mongo_url=os.environ["MONGO_URL"], db_name=f"test_{uuid.uuid4().hex}")
+
+
+@pytest.fixture
+def run_storage(tmp_path):
+    """Run a coroutine ``check(storage)`` against a fresh, set-up backend (SQLite unless given).
+
+    Mongo runs only when MONGO_URL is set, on a throwaway database dropped afterwards.
+    """
+    def runner(check, backend="sqlite"):
+        async def main():
+            storage = make_storage(backend, tmp_path)
+            await storage.setup()
+            try:
+                await check(storage)
+            finally:
+                if backend == "mongo":
+                    await storage.client.drop_database(storage.db.name)
+                await storage.close()
+        asyncio.run(main())
+    return runner
@@ -0,0 +1,230 @@
+"""
+JobQueue behaviour (retries, dead-lettering, drain, metrics) on the SQLite job store.
+"""
+import asyncio
+
+import pytest
+
+from jobs import JobQueue, utcnow
+
+
+def make_queue(storage, **options):
+    options = {"workers": 1, "poll_interval": 0.01, "backoff_base": 0, **options}
+    return JobQueue(storage.jobs, **options)
+
+
+async def wait_until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out waiting for the job queue"
+        await asyncio.sleep(0.01)
+
+
+def test_backoff_is_exponential_and_capped():
+    queue = JobQueue(store=None, backoff_base=1.0, backoff_max=5.0)
+    assert [queue.backoff(attempts) for attempts in range(1, 6)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_failed_job_is_rescheduled_with_backoff(run_storage):
+    async def check(storage):
+        queue = make_queue(storage, backoff_base=60)
+        calls = []
+
+        @queue.handler("flaky")
+        async def flaky(payload):
+            calls.append(payload)
+            raise RuntimeError("boom")
+
+        await queue.start()
+        await queue.enqueue("flaky", {"n": 1})
+        await wait_until(lambda: _true(calls))
+        await queue.drain()
+
+        stats = await storage.jobs.stats()
+        assert stats["depth"] == 1 and stats["dead"] == 0
+        # Pushed back by backoff(1) == 60s, so it is not retried yet
+        delay = (stats["oldest_run_at"] - utcnow()).total_seconds()
+        assert 55 < delay <= 60
+        assert calls == [{"n": 1}]
+    run_storage(check)
+
+
+def test_retry_then_success(run_storage):
+    async def check(storage):
+        queue = make_queue(storage, backoff_base=0.01)
+        calls = []
+
+        @queue.handler("flaky")
+        async def flaky(payload):
+            calls.append(payload)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+
+        await queue.start()
+        await queue.enqueue("flaky", {})
+        await wait_until(lambda: _metric(queue, "processed", 1))
+        await queue.drain()
+
+        metrics = await queue.metrics()
+        assert (len(calls), metrics["failed"], metrics["depth"], metrics["dead"]) == (2, 1, 0, 0)
+    run_storage(check)
+
+
+def test_dead_letter_after_max_attempts(run_storage):
+    async def check(storage):
+        queue = make_queue(storage, max_attempts=3)
+        calls = []
+
+        @queue.handler("broken")
+        async def broken(payload):
+            calls.append(payload)
+            raise RuntimeError("always fails")
+
+        await queue.start()
+        await queue.enqueue("broken", {})
+        await wait_until(lambda: _metric(queue, "dead", 1))
+        await queue.drain()
+
+        assert len(calls) == 3
+        assert (await queue.metrics())["depth"] == 0
+    run_storage(check)
+
+
+def test_unknown_job_type(run_storage):
+    async def check(storage):
+        queue = make_queue(storage)
+        with pytest.raises(ValueError):
+            await queue.enqueue("missing", {})
+
+        # A stored job whose handler is no longer registered is dead-lettered at once
+        @queue.handler("removed")
+        async def removed(payload):
+            pass
+
+        await queue.enqueue("removed", {})
+        del queue.handlers["removed"]
+        await queue.start()
+        await wait_until(lambda: _metric(queue, "dead", 1))
+        await queue.drain()
+        assert (await queue.metrics())["processed"] == 0
+    run_storage(check)
+
+
+def test_job_whose_lock_keeps_expiring_is_dead_lettered(run_storage):
+    async def check(storage):
+        queue = make_queue(storage, max_attempts=2)
+        calls = []
+
+        @queue.handler("hangs")
+        async def hangs(payload):
+            calls.append(payload)
+
+        await queue.enqueue("hangs", {})
+        # Simulate workers that died holding the job on every attempt
+        now = utcnow()
+        for _ in range(2):
+            assert await storage.jobs.claim(now, now)
+
+        await queue.start()
+        await wait_until(lambda: _metric(queue, "dead", 1))
+        await queue.drain()
+        assert calls == []
+    run_storage(check)
+
+
+def test_worker_survives_store_errors(run_storage):
+    async def check(storage):
+        queue = make_queue(storage, visibility_timeout=0.05)
+        done = []
+        complete = storage.jobs.complete
+        failures = []
+
+        async def complete_fails_once(job_id, now):
+            if not failures:
+                failures.append(job_id)
+                raise RuntimeError("database is locked")
+            await complete(job_id, now)
+
+        storage.jobs.complete = complete_fails_once
+
+        @queue.handler("work")
+        async def work(payload):
+            done.append(payload["n"])
+
+        await queue.start()
+        await queue.enqueue("work", {"n": 1})
+        await queue.enqueue("work", {"n": 2})
+        await wait_until(lambda: _metric(queue, "depth", 0))
+        assert (await queue.metrics())["workers"] == 1
+        await queue.drain()
+
+        # The job whose completion was lost ran again after its lock expired
+        assert sorted(done) == [1, 1, 2]
+    run_storage(check)
+
+
+def test_drain_finishes_backlog(run_storage):
+    async def check(storage):
+        queue = make_queue(storage, workers=2)
+        done = []
+
+        @queue.handler("work")
+        async def work(payload):
+            await asyncio.sleep(0.01)
+            done.append(payload["n"])
+
+        for n in range(5):
+            await queue.enqueue("work", {"n": n})
+        await queue.start()
+        await queue.drain(timeout=5)
+
+        assert sorted(done) == [0, 1, 2, 3, 4]
+        metrics = await queue.metrics()
+        assert (metrics["depth"], metrics["workers"], metrics["draining"]) == (0, 0, True)
+    run_storage(check)
+
+
+def test_drain_timeout_cancels_busy_workers(run_storage):
+    async def check(storage):
+        queue = make_queue(storage)
+        started = []
+
+        @queue.handler("stuck")
+        async def stuck(payload):
+            started.append(payload)
+            await asyncio.Event().wait()
+
+        await queue.start()
+        await queue.enqueue("stuck", {})
+        await wait_until(lambda: _true(started))
+        await queue.drain(timeout=0.05)
+
+        metrics = await queue.metrics()
+        # Still stored as running: another worker re-claims it once the lock expires
+        assert (metrics["workers"], metrics["in_flight"], metrics["depth"], metrics["processed"]) == (0, 0, 1, 0)
+    run_storage(check)
+
+
+def test_metrics_report_depth_and_lag(run_storage):
+    async def check(storage):
+        queue = make_queue(storage)
+
+        @queue.handler("work")
+        async def work(payload):
+            pass
+
+        assert (await queue.metrics())["lag_seconds"] == 0.0
+        await queue.enqueue("work", {}, delay=-30)
+        await queue.enqueue("work", {})
+        metrics = await queue.metrics()
+        assert metrics["depth"] == 2 and metrics["dead"] == 0
+        assert 30 <= metrics["lag_seconds"] < 35
+    run_storage(check)
+
+
+async def _true(items):
+    return bool(items)
+
+
+async def _metric(queue, name, value):
+    return (await queue.metrics())[name] == value
@@ -0,0 +1,184 @@
+"""
+Token buckets, admission control and the 429/503 responses they produce.
+"""
+import asyncio
+import json
+
+import pytest
+
+from ratelimit import (
+    AdmissionControl, MemoryRateLimitStore, MongoRateLimitStore, RateLimiter, RateLimitExceeded,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def take(store, key, rate=1.0, capacity=3):
+    return asyncio.run(store.take(key, rate, capacity))
+
+
+def test_bucket_drains_and_reports_retry_after():
+    store = MemoryRateLimitStore(clock=FakeClock())
+    assert [take(store, "ip")[0] for _ in range(3)] == [True, True, True]
+    assert take(store, "ip") == (False, 1.0)
+    # Other keys have their own bucket
+    assert take(store, "other") == (True, 0.0)
+
+
+def test_bucket_refills_over_time_up_to_capacity():
+    clock = FakeClock()
+    store = MemoryRateLimitStore(clock=clock)
+    for _ in range(3):
+        take(store, "ip")
+
+    clock.now += 0.5
+    allowed, retry_after = take(store, "ip")
+    assert not allowed and retry_after == pytest.approx(0.5)
+    clock.now += 0.5
+    assert take(store, "ip") == (True, 0.0)
+
+    clock.now += 100
+    assert [take(store, "ip")[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_evicts_least_recently_used_key():
+    store = MemoryRateLimitStore(max_keys=2, clock=FakeClock())
+    take(store, "a")
+    take(store, "b")
+    take(store, "a")
+    take(store, "c")
+    assert list(store.buckets) == ["a", "c"]
+
+
+def test_rate_limiter_raises_429_with_rounded_up_retry_after():
+    limiter = RateLimiter.per_minute(MemoryRateLimitStore(clock=FakeClock()), 2, name="logins")
+
+    async def hits():
+        await limiter.hit("k")
+        await limiter.hit("k")
+        with pytest.raises(RateLimitExceeded) as exc:
+            await limiter.hit("k")
+        return exc.value
+
+    exc = asyncio.run(hits())
+    assert (exc.status_code, exc.retry_after, exc.detail) == (429, 30, "Too many logins, slow down")
+
+
+def test_admission_rejects_over_limit_and_releases_on_exit():
+    admission = AdmissionControl(2, retry_after=2, name="logins")
+
+    async def requests():
+        async with admission:
+            async with admission:
+                assert admission.in_flight == 2
+                with pytest.raises(RateLimitExceeded) as exc:
+                    async with admission:
+                        pass
+                assert (exc.value.status_code, exc.value.retry_after) == (503, 2)
+            # One slot freed: the next request is admitted again
+            async with admission:
+                assert admission.in_flight == 2
+        with pytest.raises(RuntimeError):
+            async with admission:
+                raise RuntimeError("handler failed")
+        assert admission.in_flight == 0
+
+    asyncio.run(requests())
+
+
+class RacingCollection:
+    """Raises DuplicateKeyError on the first upsert, like a concurrent insert of the same key."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def find_one_and_update(self, *args, **kwargs):
+        from pymongo.errors import DuplicateKeyError
+
+        self.calls += 1
+        if self.calls == 1:
+            raise DuplicateKeyError("E11000 duplicate key error")
+        return {"key": args[0]["key"], "tokens": 4, "allowed": True}
+
+
+def test_mongo_store_retries_upsert_after_duplicate_key():
+    pytest.importorskip("pymongo")
+    collection = RacingCollection()
+    store = MongoRateLimitStore(collection)
+    assert asyncio.run(store.take("auth:ip:1.2.3.4", 1.0, 5)) == (True, 0.0)
+    assert collection.calls == 2
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_exceeded_handler_sets_status_and_retry_after(server, status_code):
+    exc = RateLimitExceeded(status_code, "Slow down", retry_after=2.2)
+    response = asyncio.run(server.rate_limit_exceeded_handler(make_request(), exc))
+    assert response.status_code == status_code
+    assert response.headers["Retry-After"] == "3"
+    assert json.loads(response.body) == {"detail": "Slow down"}
+
+
+def make_request(forwarded_for=None, peer="10.0.0.2"):
+    from starlette.requests import Request
+
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 51000)})
+
+
+@pytest.mark.parametrize("hops, forwarded_for, expected", [
+    (0, "6.6.6.6", "10.0.0.2"),
+    (1, "6.6.6.6, 203.0.113.7", "203.0.113.7"),
+    (2, "6.6.6.6, 203.0.113.7, 10.0.0.1", "203.0.113.7"),
+    (2, "203.0.113.7", "10.0.0.2"),
+    (1, None, "10.0.0.2"),
+])
+def test_client_ip_counts_trusted_hops_from_the_right(server, monkeypatch, hops, forwarded_for, expected):
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", hops)
+    assert server.client_ip(make_request(forwarded_for)) == expected
+
+
+def test_spoofed_forwarded_for_does_not_bypass_ip_limit(server, monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", 1)
+    store = MemoryRateLimitStore(clock=FakeClock())
+    monkeypatch.setattr(server, "auth_ip_limiter", RateLimiter.per_minute(store, 2))
+    monkeypatch.setattr(server, "auth_account_limiter", RateLimiter.per_minute(store, 100))
+
+    async def attempts():
+        # Attacker rotates the leftmost entry; the proxy appends the real peer
+        for n in range(2):
+            await server.limit_auth_attempt(make_request(f"198.51.100.{n}, 203.0.113.7"), f"user{n}@example.com")
+        with pytest.raises(RateLimitExceeded) as exc:
+            await server.limit_auth_attempt(make_request("198.51.100.99, 203.0.113.7"), "user9@example.com")
+        return exc.value
+
+    assert asyncio.run(attempts()).status_code == 429
+
+
+def test_forwarded_for_without_trusted_hops_warns_once(server, monkeypatch, caplog):
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", 0)
+    monkeypatch.setattr(server, "_warned_forwarded_for", False)
+    with caplog.at_level("WARNING", logger=server.logger.name):
+        server.client_ip(make_request())
+        assert caplog.records == []
+        server.client_ip(make_request("203.0.113.7"))
+        server.client_ip(make_request("203.0.113.8"))
+    assert [r.getMessage().startswith("Received X-Forwarded-For") for r in caplog.records] == [True]
+
+
+def test_shed_request_does_not_spend_rate_limit_tokens(server, monkeypatch):
+    store = MemoryRateLimitStore(clock=FakeClock())
+    monkeypatch.setattr(server, "auth_ip_limiter", RateLimiter.per_minute(store, 2))
+    monkeypatch.setattr(server, "auth_account_limiter", RateLimiter.per_minute(store, 2))
+    monkeypatch.setattr(server, "login_admission", AdmissionControl(0, name="logins"))
+    login = server.UserLogin(email="neo@example.com", password="hunter22")
+
+    with pytest.raises(RateLimitExceeded) as exc:
+        asyncio.run(server.login_user(login, make_request()))
+    assert exc.value.status_code == 503
+    assert dict(store.buckets) == {}
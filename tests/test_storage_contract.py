@@ -0,0 +1,258 @@
+"""
+Storage contract tests: every backend must pass the same suite.
+
+SQLite always runs; Mongo runs when MONGO_URL points at a reachable server
+(each run uses a throwaway database that is dropped afterwards).
+"""
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def run(request, run_storage):
+    """Run a coroutine ``check(storage)`` against each backend."""
+    return lambda check: run_storage(check, backend=request.param)
+
+
+def iso(minutes):
+    return (datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minutes)).isoformat()
+
+
+def post(title, content="Some content for this post", tags=(), minutes=0, author_id="u1"):
+    return {
+        "id": str(uuid.uuid4()),
+        "title": title,
+        "content": content,
+        "tags": list(tags),
+        "author": "neo",
+        "author_id": author_id,
+        "created_at": iso(minutes),
+    }
+
+
+def comment(post_id, content, minutes=0, author_id="u1"):
+    return {
+        "id": str(uuid.uuid4()),
+        "post_id": post_id,
+        "content": content,
+        "author": "neo",
+        "author_id": author_id,
+        "created_at": iso(minutes),
+    }
+
+
+def test_users_insert_and_lookup(run):
+    async def check(storage):
+        user = {"id": "u1", "email": "neo@example.com", "hashed_password": "x",
+                "is_active": True, "created_at": iso(0)}
+        await storage.users.insert(user)
+        assert await storage.users.get_by_email("neo@example.com") == user
+        assert await storage.users.get_by_email("trinity@example.com") is None
+    run(check)
+
+
+def test_posts_round_trip_and_delete(run):
+    async def check(storage):
+        p = post("Buffer overflows 101", tags=["exploit", "c"])
+        await storage.posts.insert(p)
+        assert await storage.posts.get(p["id"]) == p
+        assert await storage.posts.delete(p["id"]) is True
+        assert await storage.posts.get(p["id"]) is None
+        assert await storage.posts.delete(p["id"]) is False
+        assert await storage.posts.list() == []
+    run(check)
+
+
+def test_posts_list_newest_first_with_limit(run):
+    async def check(storage):
+        for minutes in (5, 1, 9):
+            await storage.posts.insert(post(f"Post at minute {minutes}", minutes=minutes))
+        titles = [p["title"] for p in await storage.posts.list(limit=2)]
+        assert titles == ["Post at minute 9", "Post at minute 5"]
+    run(check)
+
+
+def test_posts_filter_by_tag_and_search(run):
+    async def check(storage):
+        await storage.posts.insert(post("OSINT recon basics", tags=["osint"], minutes=1))
+        await storage.posts.insert(post("Kernel exploitation", content="Heap grooming in the kernel",
+                                        tags=["exploit"], minutes=2))
+        await storage.posts.insert(post("Web fuzzing", tags=["web", "exploit"], minutes=3))
+        await storage.posts.insert(post("Réseau scans", content="Nmap", tags=["ÉCOUTE"]))
+
+        assert [p["title"] for p in await storage.posts.list(tag="exploit")] == [
+            "Web fuzzing", "Kernel exploitation"]
+        assert await storage.posts.list(tag="missing") == []
+        # Case-insensitive substring match over title, content and tags
+        assert [p["title"] for p in await storage.posts.list(search="GROOM")] == ["Kernel exploitation"]
+        assert [p["title"] for p in await storage.posts.list(search="osi")] == ["OSINT recon basics"]
+        assert [p["title"] for p in await storage.posts.list(search="we")] == ["Web fuzzing"]
+        assert [p["title"] for p in await storage.posts.list(tag="exploit", search="fuzz")] == ["Web fuzzing"]
+        # Unicode case folding, for short and trigram-indexed terms alike
+        assert [p["title"] for p in await storage.posts.list(search="RÉ")] == ["Réseau scans"]
+        assert [p["title"] for p in await storage.posts.list(search="écou")] == ["Réseau scans"]
+        # Each tag is matched on its own, never across tag boundaries
+        assert [p["title"] for p in await storage.posts.list(search="oit")] == ["Web fuzzing", "Kernel exploitation"]
+        assert await storage.posts.list(search="web exp") == []
+        assert await storage.posts.list(search="b e") == []
+        assert await storage.posts.count_with_tag("exploit") == 2
+    run(check)
+
+
+def test_posts_search_is_literal(run):
+    async def check(storage):
+        await storage.posts.insert(post("Exploiting c++ vtables", minutes=1))
+        await storage.posts.insert(post("Abc of recon", minutes=2))
+        await storage.posts.insert(post("Notes on a.c files", minutes=3))
+        await storage.posts.insert(post("Web (in)security", minutes=4))
+
+        async def titles(search):
+            return [p["title"] for p in await storage.posts.list(search=search)]
+
+        assert await titles("a.c") == ["Notes on a.c files"]
+        assert await titles("a.") == ["Notes on a.c files"]
+        assert await titles("c++") == ["Exploiting c++ vtables"]
+        assert await titles("(in)") == ["Web (in)security"]
+        assert await titles("^Web") == []
+        assert await titles("recon$") == []
+        assert await titles("(a+)+$") == []
+    run(check)
+
+
+def test_comments_oldest_first_and_delete_for_post(run):
+    async def check(storage):
+        p = post("Threat modelling")
+        other = post("Another post")
+        await storage.posts.insert(p)
+        await storage.posts.insert(other)
+        await storage.comments.insert(comment(p["id"], "second", minutes=2))
+        await storage.comments.insert(comment(p["id"], "first", minutes=1))
+        await storage.comments.insert(comment(other["id"], "elsewhere"))
+
+        assert [c["content"] for c in await storage.comments.list_for_post(p["id"])] == ["first", "second"]
+        assert await storage.comments.delete_for_post(p["id"]) == ["u1"]
+        assert await storage.comments.list_for_post(p["id"]) == []
+        assert len(await storage.comments.list_for_post(other["id"])) == 1
+    run(check)
+
+
+def test_tag_counts(run):
+    async def check(storage):
+        await storage.posts.insert(post("Red team notes", tags=["redteam", "osint"]))
+        await storage.posts.insert(post("More red team", tags=["redteam"]))
+        await storage.tags.backfill()
+        assert await storage.tags.top() == [{"tag": "redteam", "count": 2}, {"tag": "osint", "count": 1}]
+
+        await storage.tags.set_count("osint", 0, version="v2")
+        await storage.tags.set_count("redteam", 3, version="v2")
+        await storage.tags.backfill()  # no-op once counters exist
+        assert await storage.tags.top(limit=5) == [{"tag": "redteam", "count": 3}]
+
+        # A slower recount that read before the stored one must not overwrite it
+        await storage.tags.set_count("redteam", 1, version="v1")
+        await storage.tags.set_count("osint", 5, version="v1")
+        assert await storage.tags.top(limit=5) == [{"tag": "redteam", "count": 3}]
+        await storage.tags.set_count("redteam", 4, version="v3")
+        await storage.tags.set_count("fresh", 1, version="v1")
+        assert await storage.tags.top(limit=5) == [{"tag": "redteam", "count": 4}, {"tag": "fresh", "count": 1}]
+    run(check)
+
+
+def test_jobs_claim_retry_dead_letter(run):
+    async def check(storage):
+        jobs = storage.jobs
+        await jobs.setup(done_ttl_seconds=3600)
+        now = datetime.now(timezone.utc)
+        job = {"id": "j1", "type": "tags.recount", "payload": {"tags": ["a"]}, "status": "pending",
+               "attempts": 0, "run_at": now, "created_at": now, "idempotency_key": "post.created:1"}
+        assert await jobs.insert(job) == "j1"
+        assert await jobs.insert({**job, "id": "j2"}) == "j1"
+
+        claimed = await jobs.claim(now, now + timedelta(seconds=60))
+        assert (claimed["id"], claimed["attempts"], claimed["payload"]) == ("j1", 1, {"tags": ["a"]})
+        assert await jobs.claim(now, now + timedelta(seconds=60)) is None
+
+        # An expired lock makes the job claimable again (at-least-once)
+        later = now + timedelta(seconds=61)
+        assert (await jobs.claim(later, later + timedelta(seconds=60)))["attempts"] == 2
+
+        await jobs.retry("j1", "boom", later + timedelta(seconds=10))
+        assert await jobs.claim(later, later + timedelta(seconds=60)) is None
+        stats = await jobs.stats()
+        assert stats["depth"] == 1 and stats["dead"] == 0
+        assert abs((stats["oldest_run_at"] - (later + timedelta(seconds=10))).total_seconds()) < 0.01
+
+        await jobs.dead_letter("j1", "boom", later)
+        stats = await jobs.stats()
+        assert (stats["depth"], stats["dead"], stats["oldest_run_at"]) == (0, 1, None)
+
+        unkeyed = dict(job, id="j3")
+        del unkeyed["idempotency_key"]
+        await jobs.insert(unkeyed)
+        claimed = await jobs.claim(later, later + timedelta(seconds=60))
+        await jobs.complete(claimed["id"], later)
+        assert (await jobs.stats())["depth"] == 0
+    run(check)
+
+
+def test_author_feeds_keyset_pagination(run):
+    async def check(storage):
+        # Two posts share a timestamp so the id tiebreak is exercised
+        for minutes in (1, 2, 2, 3, 4):
+            await storage.posts.insert(post(f"Post at minute {minutes}", minutes=minutes, author_id="u1"))
+        await storage.posts.insert(post("Someone else's post", minutes=5, author_id="u2"))
+
+        seen, before = [], None
+        while True:
+            page = await storage.posts.list_by_author("u1", before=before, limit=2)
+            if not page:
+                break
+            seen.extend(page)
+            before = (page[-1]["created_at"], page[-1]["id"])
+        assert len(seen) == 5 and len({p["id"] for p in seen}) == 5
+        assert seen == sorted(seen, key=lambda p: (p["created_at"], p["id"]), reverse=True)
+        assert await storage.posts.count_by_author("u1") == 5
+        assert await storage.posts.list_by_author("nobody") == []
+
+        target = seen[0]
+        await storage.comments.insert(comment(target["id"], "first", minutes=1, author_id="u2"))
+        await storage.comments.insert(comment(target["id"], "second", minutes=2, author_id="u2"))
+        await storage.comments.insert(comment(target["id"], "reply", minutes=3, author_id="u1"))
+        page = await storage.comments.list_by_author("u2", limit=1)
+        assert [c["content"] for c in page] == ["second"]
+        page = await storage.comments.list_by_author("u2", before=(page[0]["created_at"], page[0]["id"]))
+        assert [c["content"] for c in page] == ["first"]
+        assert await storage.comments.count_by_author("u2") == 2
+        assert await storage.comments.delete_for_post(target["id"]) == ["u1", "u2"]
+        assert await storage.comments.delete_for_post(target["id"]) == []
+    run(check)
+
+
+def test_user_counts(run):
+    async def check(storage):
+        user = {"id": "u1", "email": "neo@example.com", "hashed_password": "x",
+                "is_active": True, "created_at": iso(0)}
+        await storage.users.insert(user)
+        assert await storage.users.get("u1") == user
+        assert await storage.users.get("u2") is None
+
+        await storage.users.set_count("u1", "post_count", 3, version="v2")
+        await storage.users.set_count("u1", "comment_count", 7, version="v2")
+        stored = await storage.users.get("u1")
+        assert (stored["post_count"], stored["comment_count"]) == (3, 7)
+        assert (await storage.users.get_by_email("neo@example.com"))["post_count"] == 3
+
+        # A slower recount that read before the stored one must not overwrite it
+        await storage.users.set_count("u1", "post_count", 1, version="v1")
+        assert (await storage.users.get("u1"))["post_count"] == 3
+        await storage.users.set_count("u1", "post_count", 4, version="v3")
+        # Each counter has its own version
+        await storage.users.set_count("u1", "comment_count", 8, version="v2.5")
+        stored = await storage.users.get("u1")
+        assert (stored["post_count"], stored["comment_count"]) == (4, 8)
+
+        with pytest.raises(ValueError):
+            await storage.users.set_count("u1", "email", 1, version="v9")
+    run(check)
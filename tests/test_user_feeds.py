@@ -0,0 +1,186 @@
+"""
+Author feeds, profile counters and the authors.recount job, exercised through
+the route handlers on the SQLite backend.
+"""
+import base64
+from datetime import timedelta
+
+import pytest
+
+from jobs import utcnow
+from ratelimit import MemoryRateLimitStore, RateLimiter
+
+
+@pytest.fixture
+def app(server, monkeypatch, run_storage):
+    """Point the app module at a fresh storage; returns a runner for ``check(server, storage)``."""
+    monkeypatch.setattr(server, "write_limiter", RateLimiter.per_minute(MemoryRateLimitStore(), 1000))
+
+    def runner(check):
+        async def with_app(storage):
+            monkeypatch.setattr(server, "storage", storage)
+            monkeypatch.setattr(server.job_queue, "store", storage.jobs)
+            await check(server, storage)
+        run_storage(with_app)
+    return runner
+
+
+async def create_user(server, storage, email, legacy=False):
+    user = server.User(email=email, hashed_password="x")
+    user_dict = server.prepare_for_mongo(user.dict())
+    if legacy:
+        # Accounts created before the counters existed
+        del user_dict["post_count"], user_dict["comment_count"]
+    await storage.users.insert(user_dict)
+    return user
+
+
+async def create_post(server, user, title, tags=()):
+    post_data = server.PostCreate(title=title, content="Detailed write-up content", tags=list(tags))
+    return await server.create_post(post_data, current_user=user)
+
+
+async def create_comment(server, user, post, content):
+    comment_data = server.CommentCreate(post_id=post.id, content=content)
+    return await server.create_comment(comment_data, current_user=user)
+
+
+async def run_jobs(server, storage):
+    """Execute every queued job once, the way a worker would."""
+    while True:
+        now = utcnow()
+        job = await storage.jobs.claim(now, now + timedelta(seconds=60))
+        if job is None:
+            return
+        await server.job_queue.handlers[job["type"]](job["payload"])
+        await storage.jobs.complete(job["id"], now)
+
+
+async def counts(server, user):
+    profile = await server.get_user_profile(user.id)
+    return profile.post_count, profile.comment_count
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    base64.urlsafe_b64encode(b"no separator").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|x").decode(),
+])
+def test_malformed_cursor_is_rejected_with_400(server, cursor):
+    with pytest.raises(server.HTTPException) as exc:
+        server.decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_malformed_cursor_on_feed_endpoint(app):
+    async def check(server, storage):
+        with pytest.raises(server.HTTPException) as exc:
+            await server.get_user_posts("someone", cursor="!!!", limit=20)
+        assert exc.value.status_code == 400
+    app(check)
+
+
+def test_feeds_paginate_with_next_cursor(app):
+    async def check(server, storage):
+        neo = await create_user(server, storage, "neo@example.com")
+        trinity = await create_user(server, storage, "trinity@example.com")
+        posts = [await create_post(server, neo, f"Field notes part {n}") for n in range(5)]
+        await create_post(server, trinity, "Not in the feed of neo")
+        for n in range(3):
+            await create_comment(server, neo, posts[0], f"comment {n}")
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = await server.get_user_posts(neo.id, cursor=cursor, limit=2)
+            seen.extend(page.items)
+            pages += 1
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        assert pages == 3
+        assert [p.id for p in seen] == [p.id for p in sorted(posts, key=lambda p: (p.created_at, p.id), reverse=True)]
+
+        first = await server.get_user_comments(neo.id, cursor=None, limit=2)
+        rest = await server.get_user_comments(neo.id, cursor=first.next_cursor, limit=2)
+        assert [c.content for c in first.items + rest.items] == ["comment 2", "comment 1", "comment 0"]
+        assert rest.next_cursor is None
+    app(check)
+
+
+def test_profile_backfills_counters_for_older_accounts(app):
+    async def check(server, storage):
+        old = await create_user(server, storage, "old@example.com", legacy=True)
+        post = await create_post(server, old, "Posted before counters")
+        await create_comment(server, old, post, "and a comment")
+        assert "post_count" not in await storage.users.get(old.id)
+
+        assert await counts(server, old) == (1, 1)
+        stored = await storage.users.get(old.id)
+        assert (stored["post_count"], stored["comment_count"]) == (1, 1)
+
+        with pytest.raises(server.HTTPException) as exc:
+            await server.get_user_profile("missing")
+        assert exc.value.status_code == 404
+    app(check)
+
+
+def test_authors_recount_on_create_and_delete(app):
+    async def check(server, storage):
+        neo = await create_user(server, storage, "neo@example.com")
+        trinity = await create_user(server, storage, "trinity@example.com")
+        first = await create_post(server, neo, "First red team report", tags=["redteam"])
+        second = await create_post(server, neo, "Second red team report")
+        await create_comment(server, trinity, first, "nice")
+        await create_comment(server, trinity, first, "very nice")
+        await create_comment(server, neo, second, "thanks")
+
+        assert await counts(server, neo) == (0, 0)  # not recounted until the jobs run
+        await run_jobs(server, storage)
+        assert await counts(server, neo) == (2, 1)
+        assert await counts(server, trinity) == (0, 2)
+
+        # Deleting a post also recounts the authors of its comments
+        await server.delete_post(first.id, current_user=neo)
+        await run_jobs(server, storage)
+        assert await counts(server, neo) == (1, 1)
+        assert await counts(server, trinity) == (0, 0)
+        assert await storage.tags.top() == []
+    app(check)
+
+
+def test_comment_recount_leaves_post_count_alone(app, monkeypatch):
+    async def check(server, storage):
+        neo = await create_user(server, storage, "neo@example.com")
+        post = await create_post(server, neo, "Red team report")
+        await run_jobs(server, storage)
+
+        post_counts = []
+        count_posts = storage.posts.count_by_author
+
+        async def counting(author_id):
+            post_counts.append(author_id)
+            return await count_posts(author_id)
+
+        monkeypatch.setattr(storage.posts, "count_by_author", counting)
+        await create_comment(server, neo, post, "follow-up")
+        await run_jobs(server, storage)
+        assert await counts(server, neo) == (1, 1)
+        assert post_counts == []
+    app(check)
+
+
+def test_delete_recounts_authors_of_the_deleted_comments(app):
+    async def check(server, storage):
+        neo = await create_user(server, storage, "neo@example.com")
+        trinity = await create_user(server, storage, "trinity@example.com")
+        post = await create_post(server, neo, "Short-lived report")
+        await run_jobs(server, storage)
+
+        # A comment whose own recount has not run: only the delete can correct the count
+        await storage.comments.insert(server.prepare_for_mongo(server.Comment(
+            post_id=post.id, content="late", author="trinity", author_id=trinity.id).dict()))
+        await storage.users.set_count(trinity.id, "comment_count", 1, version="0")
+        await server.delete_post(post.id, current_user=neo)
+        await run_jobs(server, storage)
+        assert await counts(server, trinity) == (0, 0)
+    app(check)